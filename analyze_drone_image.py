@@ -3,257 +3,823 @@
 Quick script to analyze your drone image and save cracks in YOLO format
 """
 
+from __future__ import annotations
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
 import json
 import os
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urlsplit
 
-def get_filename_from_url(url: str) -> str:
-    """Extract filename from URL without extension."""
-    parsed = urlparse(url)
-    filename = os.path.basename(parsed.path)
-    return os.path.splitext(filename)[0]
-
-def save_yolo_labels(cracks: list, output_path: str) -> None:
-    """Save cracks in YOLO format to a text file."""
-    lines = []
-    for crack in cracks:
-        bbox = crack.get("bbox_2d", [])
-        if len(bbox) >= 5:
-            # Format: class_id x_center y_center width height
-            class_id = int(bbox[0])
-            x_center = float(bbox[1])
-            y_center = float(bbox[2])
-            width = float(bbox[3])
-            height = float(bbox[4])
-            lines.append(f"{class_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}")
+try:
+    # SIMD (AVX2/SSSE3/NEON) encoder, same API as the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+try:
+    # Rust JSON codec; returns bytes and decodes straight from bytes
+    import orjson
+    
+    json_loads = orjson.loads
     
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-        if lines:
-            f.write("\n")
+    def json_dumps_bytes(obj, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:
+    json_loads = json.loads
     
-    print(f"✓ Saved {len(lines)} crack(s) to: {output_path}")
+    def json_dumps_bytes(obj, indent: bool = False) -> bytes:
+        return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+DEFAULT_IMAGE_URL = "https://obj3423.public-dk6.clu4.obj.storagefactory.io/dev-poc-drone-images/Chat/Testpulje/uploaded/DJI_0942.JPG"
+
+OLLAMA_URL = "http://localhost:11434"
+
+# Shared connection pool for the image host and Ollama, reused across images.
+# Idempotent requests (downloads, /api/tags) retry dropped connections briefly
+# instead of failing the image.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                       max_retries=Retry(total=2, backoff_factor=0.2))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Ollama requests (the longest mounted prefix wins) also retry chat POSTs that
+# are refused or answered 502/503/504 while the server restarts or is busy.
+# The pre-serialized body bytes are resent as-is; read timeouts are never
+# retried, since the model may simply still be generating.
+SESSION.mount(OLLAMA_URL, HTTPAdapter(
+    pool_connections=16, pool_maxsize=16,
+    max_retries=Retry(total=2, read=0, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({"GET", "POST"}), raise_on_status=False)
+))
+
+# Downloaded images and their base64 encoding, keyed by a hash of the URL
+IMAGE_CACHE_DIR = Path(".img_cache")
+
+# Longest side of the image sent to the model; 0 sends the original file
+MAX_IMAGE_SIDE = 672
+
+# Multiple of 3 so each chunk base64-encodes without padding; 192 KiB keeps
+# the per-chunk write/encode/copy overhead small for multi-MB drone frames
+DOWNLOAD_CHUNK_SIZE = 3 * 64 * 1024
+
+
+# Opening of the detections array in a streamed reply
+CRACKS_ARRAY_RE = re.compile(r'"(?:cracks|boxes)"\s*:\s*\[')
+
+_json_decoder = json.JSONDecoder()
+
+# Stands in for the image inside the serialized request; see build_chat_body()
+IMAGE_PLACEHOLDER = "__IMAGE_BASE64__"
+
+# YOLO class ids, shared with annotate_bboxes_from_url.py
+YOLO_CLASSES = (
+    "crack",
+    "spalling",
+    "mortar_erosion",
+    "water_damage",
+    "displacement",
+    "efflorescence",
+    "hole",
+    "deformation"
+)
+
+# Prompts are identical for every image, so they are built once at import
+SYSTEM_PROMPT = (
+    "You are an experienced architect inspecting structures from drone imagery. "
+    "Analyze images for structural issues, cracks, mortar problems, water damage, "
+    "and any defects. Be specific about locations and severity."
+)
+
+USER_PROMPT = (
+    "You are inspecting a brick wall for structural defects. Scan EVERY part of the image systematically and identify ALL visible issues:\n"
+    "- Cracks (hairline, vertical, horizontal, diagonal)\n"
+    "- Mortar erosion or gaps in joints\n"
+    "- Spalled or damaged bricks\n"
+    "- Color variations indicating water damage\n"
+    "- Any irregularities in the brickwork\n\n"
+
+    "CRITICAL INSTRUCTIONS:\n"
+    "1. Each defect needs its OWN SMALL bounding box - draw tight boxes around individual cracks, not large areas\n"
+    "2. If you see 5 different cracks, create 5 separate bounding boxes\n"
+    "3. Small cracks should have small boxes (width/height around 0.02-0.10)\n"
+    "4. DO NOT create one large box covering multiple defects\n\n"
+
+    "OUTPUT FORMAT - You MUST return EXACTLY 5 values in bbox_2d array:\n"
+    "\"bbox_2d\": [0, x_center, y_center, width, height]\n\n"
+
+    "Where:\n"
+    "- First value is ALWAYS 0 (class_id for crack)\n"
+    "- x_center: horizontal center of the crack (0.0=left edge, 1.0=right edge)\n"
+    "- y_center: vertical center of the crack (0.0=top, 1.0=bottom)\n"
+    "- width: crack width as fraction of image (typically 0.02-0.10 for thin cracks)\n"
+    "- height: crack height as fraction of image (typically 0.02-0.10 for small cracks)\n\n"
+
+    "EXAMPLE of correct format:\n"
+    "{\n"
+    "  \"cracks\": [\n"
+    "    {\"bbox_2d\": [0, 0.356, 0.568, 0.076, 0.026], \"description\": \"horizontal hairline crack in mortar joint\"},\n"
+    "    {\"bbox_2d\": [0, 0.291, 0.473, 0.033, 0.014], \"description\": \"faint horizontal mortar erosion\"},\n"
+    "    {\"bbox_2d\": [0, 0.371, 0.457, 0.035, 0.018], \"description\": \"slight vertical mortar separation\"}\n"
+    "  ]\n"
+    "}\n\n"
+
+    "Return ONLY valid JSON - no extra text. If you find nothing, return {\"cracks\": []}.\n"
+    "⚠️ Be thorough - typical drone images have 5-15 detectable defects."
+)
+
+# Quantization suffixes of the Ollama library tags. The plain tags (llava:13b)
+# are already q4_0; q4_K_M is usually as fast with better quality, q8_0 and
+# fp16 trade speed and memory for accuracy.
+QUANTIZATIONS = ("fp16", "q8_0", "q4_K_M", "q4_0")
+
+# How long Ollama keeps the model in memory after the last request
+MODEL_KEEP_ALIVE = "1h"
+
+CHAT_PAYLOAD = {
+    "model": "llava:13b",
+    "messages": [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT, "images": [IMAGE_PLACEHOLDER]}
+    ],
+    "format": "json",
+    "stream": True,
+    "keep_alive": MODEL_KEEP_ALIVE,
+    "options": {
+        "temperature": 0.3,
+        "top_p": 0.9
+    }
+}
+
+@functools.lru_cache(maxsize=4096)
+def get_filename_from_url(url: str) -> str:
+    """Extract filename from URL without extension; memoized for batches and retries."""
+    path = url.partition("#")[0].partition("?")[0]
+    filename = path.rpartition("/")[2]
+    stem = filename.rpartition(".")[0]
+    return stem or filename
+
+# One YOLO label line; repeated per row and %-formatted in a single C call
+YOLO_ROW_TEMPLATE = b"%d %.6f %.6f %.6f %.6f\n"
+
+def crack_rows(cracks: list) -> list:
+    """Validate the model's cracks once and return their bbox_2d as float rows.
+
+    Entries that are not objects, lack a 5-value bbox_2d or hold non-numeric
+    values are dropped, so the writers below can format the rows unchecked.
+    """
+    rows = []
+    for crack in cracks:
+        bbox = crack.get("bbox_2d") if isinstance(crack, dict) else None
+        if not isinstance(bbox, list) or len(bbox) < 5:
+            continue
+        try:
+            rows.append([float(v) for v in bbox[:5]])
+        except (TypeError, ValueError):
+            continue
+    return rows
+
+def format_yolo_labels(cracks: list) -> bytes:
+    """Return the YOLO label file contents for cracks, one "class xc yc w h" line each."""
+    # Format: class_id x_center y_center width height
+    rows = crack_rows(cracks)
+    return (YOLO_ROW_TEMPLATE * len(rows)) % tuple(v for row in rows for v in row)
+
+NEWLINE = b"\n"
+
+# Contents of classes.txt, one class name per line
+YOLO_CLASSES_BYTES = ("\n".join(YOLO_CLASSES) + "\n").encode("utf-8")
 
 def save_yolo_classes(output_path: str) -> None:
     """Save YOLO classes.txt file with class names."""
-    classes = [
-        "crack",
-        "spalling",
-        "mortar_erosion",
-        "water_damage",
-        "displacement",
-        "efflorescence",
-        "hole",
-        "deformation"
-    ]
+    Path(output_path).write_bytes(YOLO_CLASSES_BYTES)
+
+def download_image_base64(image_url: str, image_path: str, encode: bool = True) -> bytearray | None:
+    """Stream an image to disk, base64-encoding it chunk by chunk unless encode is False.
+
+    The full download is never held in memory next to its encoding; the
+    output buffer is sized from Content-Length when the server sends it.
+    """
+    with SESSION.get(image_url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+        if not encode:
+            with open(image_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            return None
+
+        size = int(response.headers.get("Content-Length") or 0)
+        encoded = bytearray((size + 2) // 3 * 4)
+        pos = 0
+        pending = b""
+        with open(image_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                if pending:
+                    chunk = pending + chunk
+                cut = len(chunk) - len(chunk) % 3
+                block = base64.b64encode(memoryview(chunk)[:cut])
+                encoded[pos:pos + len(block)] = block
+                pos += len(block)
+                pending = chunk[cut:]
+        block = base64.b64encode(pending)
+        encoded[pos:pos + len(block)] = block
+        pos += len(block)
+    del encoded[pos:]
+    return encoded
+
+def shrink_image(source, max_side: int = MAX_IMAGE_SIDE) -> bytes | None:
+    """Return JPEG bytes of the image shrunk to fit within max_side x max_side, or None if it already fits.
+
+    source is a path or a binary file object. Also used by old/OllamaImageAnalyzer.py.
+    """
+    with Image.open(source) as img:
+        if max(img.size) <= max_side:
+            return None
+        # Let libjpeg decode at 1/2..1/8 scale instead of full size
+        img.draft("RGB", (max_side, max_side))
+        img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        return buffer.getvalue()
+
+def encode_image_for_model(image_path: str, max_side: int = MAX_IMAGE_SIDE) -> bytes:
+    """Return the base64 JPEG of an image shrunk to fit within max_side x max_side.
+
+    LLaVA's vision tower works on 336 px tiles (at most 672 px per side), so
+    the extra pixels of a full drone frame only cost encoding, upload and
+    server-side decoding. Boxes come back normalized, so they still map onto
+    the full-size image saved in the results folder.
+    """
+    small = shrink_image(image_path, max_side)
+    if small is not None:
+        return base64.b64encode(small)
+    with open(image_path, "rb") as f:
+        return base64.b64encode(f.read())
+
+@contextlib.contextmanager
+def _atomic_path(path: Path):
+    """Yield a temporary file next to path that is renamed onto path, so readers never see partial files.
+
+    The temporary file is removed again if the block raises.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _atomic_write(path: Path, data) -> None:
+    """Write data next to path and rename it into place."""
+    with _atomic_path(path) as tmp_path:
+        Path(tmp_path).write_bytes(data)
+
+def cached_image_path(image_url: str) -> Path:
+    """Return where the downloaded image for image_url is kept in IMAGE_CACHE_DIR."""
+    return IMAGE_CACHE_DIR / f"{hashlib.sha1(image_url.encode('utf-8')).hexdigest()}.img"
+
+def fetch_image_base64(image_url: str, image_path: str, use_cache: bool = True,
+                       max_side: int = MAX_IMAGE_SIDE):
+    """Save the image at image_path and return (base64 bytes, served_from_cache).
+
+    The base64 is of the image as sent to the model, shrunk to max_side
+    unless max_side is 0. A repeat run for the same URL copies the cached
+    image and reads the cached base64 instead of downloading and encoding again.
+    """
+    cached_image = cached_image_path(image_url)
+    cached_base64 = cached_image.with_suffix(f".{max_side or 'full'}.b64")
     
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(classes))
-        f.write("\n")
+    if use_cache and cached_image.exists() and cached_base64.exists():
+        shutil.copyfile(cached_image, image_path)
+        return cached_base64.read_bytes(), True
     
-    print(f"✓ Saved class definitions to: {output_path}")
+    if max_side:
+        download_image_base64(image_url, image_path, encode=False)
+        image_base64 = encode_image_for_model(image_path, max_side)
+    else:
+        image_base64 = download_image_base64(image_url, image_path)
+    if use_cache:
+        IMAGE_CACHE_DIR.mkdir(exist_ok=True)
+        # Copied file to file in chunks; the image is never read into memory whole
+        with _atomic_path(cached_image) as tmp_path:
+            shutil.copyfile(image_path, tmp_path)
+        _atomic_write(cached_base64, image_base64)
+    return image_base64, False
+
+@functools.lru_cache(maxsize=8)
+def _chat_body_parts(model: str) -> tuple:
+    """Serialize CHAT_PAYLOAD for model once and split it around IMAGE_PLACEHOLDER."""
+    body = json_dumps_bytes({**CHAT_PAYLOAD, "model": model})
+    head, _, tail = body.partition(f'"{IMAGE_PLACEHOLDER}"'.encode("ascii"))
+    return head + b'"', b'"' + tail
+
+def build_chat_body(image_base64: bytes | bytearray, model: str = CHAT_PAYLOAD["model"]) -> bytes:
+    """Build the Ollama chat request body with the base64 image spliced in as bytes.
+
+    Base64 is plain ASCII and needs no JSON escaping, so the encoded image is
+    joined between the cached, pre-serialized halves of CHAT_PAYLOAD instead of being
+    decoded to a str and re-scanned by a JSON encoder on every request.
+    The ollama SDK's raw-bytes images are no shortcut: it base64-encodes them
+    itself and serializes the whole payload again on each call.
+    """
+    head, tail = _chat_body_parts(model)
+    return b"".join((head, image_base64, tail))
+
+class JsonArrayScanner:
+    """Pick the objects of a JSON array out of text that arrives in pieces.
+
+    feed(text) returns the objects that text completed. Before the array's
+    opening (opening_re) has been seen only a short tail of the text is kept,
+    and after it only the object still being written, so each piece is
+    scanned once instead of re-searching the whole reply on every token.
+    """
+
+    # Text kept back while looking for the opening; longer than any match
+    LOOKBACK = 256
+
+    def __init__(self, opening_re: re.Pattern):
+        self.opening_re = opening_re
+        self._pending = ""
+        self._in_array = False
+        self._closed = False
+
+    def feed(self, text: str) -> list:
+        """Add the next piece of the reply and return the array objects it completed."""
+        if self._closed:
+            return []
+        buf = self._pending + text
+        if not self._in_array:
+            match = self.opening_re.search(buf)
+            if match is None:
+                self._pending = buf[-self.LOOKBACK:]
+                return []
+            self._in_array = True
+            buf = buf[match.end():]
+        objects = []
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] != "{":
+                self._closed = True  # end of the array
+                break
+            try:
+                obj, pos = _json_decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # object not complete yet
+            objects.append(obj)
+        self._pending = buf[pos:]
+        return objects
+
+def read_streamed_content(response, on_crack=None, on_token=None) -> str:
+    """Collect a streamed Ollama chat reply and return the full message content.
 
-def create_results_folder() -> str:
+    on_token(text) receives each content delta as it arrives.
+    on_crack(index, crack) is called as soon as each object in the
+    "cracks"/"boxes" array is complete, before the model has finished.
+    Raises ValueError as soon as the reply cannot be JSON, so the request
+    is dropped instead of letting the model generate to its token limit.
+    """
+    parts = []
+    started = False  # whether the first non-whitespace character has been checked
+    scanner = JsonArrayScanner(CRACKS_ARRAY_RE) if on_crack else None
+    count = 0
+    for line in response.iter_lines():
+        if not line:
+            continue
+        chunk = json_loads(line)
+        if "error" in chunk:
+            raise RuntimeError(chunk["error"])
+        token = chunk.get("message", {}).get("content", "")
+        parts.append(token)
+        if on_token and token:
+            on_token(token)
+        
+        if not started and token.strip():
+            started = True
+            if not token.lstrip().startswith("{"):
+                raise ValueError(f"Response is not a JSON object: {''.join(parts)[:40]!r}")
+        
+        if scanner and token:
+            for crack in scanner.feed(token):
+                count += 1
+                on_crack(count, crack)
+        
+        if chunk.get("done"):
+            break
+    return "".join(parts)
+
+def find_cracks(findings: dict) -> list:
+    """Return the list of detections in the model's reply, whatever key it came under.
+
+    The prompt asks for "cracks" and older replies use "boxes", but models
+    also translate or misspell the key, so otherwise the first list of
+    objects carrying a bbox_2d is taken.
+    """
+    cracks = findings.get("cracks") or findings.get("boxes")
+    if cracks:
+        return cracks
+    return next(
+        (value for value in findings.values()
+         if isinstance(value, list) and value and isinstance(value[0], dict) and "bbox_2d" in value[0]),
+        []
+    )
+
+def probe_ollama(timeout: float = 2.0) -> None:
+    """Raise OSError unless something accepts TCP connections at OLLAMA_URL.
+
+    A connect-only liveness check; the model list is fetched by check_ollama
+    only when a model actually needs to be validated.
+    """
+    address = urlsplit(OLLAMA_URL)
+    socket.create_connection((address.hostname, address.port or 80), timeout=timeout).close()
+
+@functools.lru_cache(maxsize=1)
+def check_ollama() -> tuple:
+    """Return the names of the models installed in Ollama; raises if it is unreachable.
+
+    Only a successful probe is cached, so batch runs and repeated imports hit
+    /api/tags once per process while a failed probe can still be retried.
+    """
+    health_check = SESSION.get(f"{OLLAMA_URL}/api/tags", timeout=5)
+    health_check.raise_for_status()
+    models = json_loads(health_check.content).get("models", [])
+    return tuple(m.get("name") for m in models)
+
+def resolve_model_name(model: str, quant: str | None = None) -> str:
+    """Return the Ollama tag for model at the given quantization, e.g. llava:13b + q8_0 -> llava:13b-q8_0.
+
+    A model whose tag already names a quantization is returned unchanged.
+    """
+    if not quant:
+        return model
+    name, _, tag = model.partition(":")
+    if any(q in tag for q in QUANTIZATIONS):
+        return model
+    return f"{name}:{tag or 'latest'}-{quant}"
+
+def warm_up_model(model: str = CHAT_PAYLOAD["model"]) -> bool:
+    """Ask Ollama to load the model now, so the first image does not pay for it.
+
+    The warm-up is a one-token chat with the same system prompt and options as
+    the real requests, which loads the model for MODEL_KEEP_ALIVE and leaves
+    the system prompt prefilled in its cache for the first image to reuse.
+    Failures are ignored; the chat request loads the model anyway.
+    """
+    payload = {
+        "model": model,
+        "messages": [{"role": "system", "content": SYSTEM_PROMPT}],
+        "stream": False,
+        "keep_alive": MODEL_KEEP_ALIVE,
+        "options": {**CHAT_PAYLOAD["options"], "num_predict": 1}
+    }
+    try:
+        response = SESSION.post(f"{OLLAMA_URL}/api/chat", data=json_dumps_bytes(payload),
+                                headers={"Content-Type": "application/json"}, timeout=300)
+        return response.ok
+    except requests.RequestException:
+        return False
+
+def run_in_daemon_thread(fn, *args) -> Future:
+    """Start fn(*args) on a daemon thread and return a Future of its result.
+
+    Unlike an executor's worker, a daemon thread does not hold up sys.exit()
+    when the script gives up before the result is needed.
+    """
+    future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+def create_results_folder(results_folder: str = "results") -> str:
     """Create results subfolder if it doesn't exist."""
-    results_folder = "results"
     os.makedirs(results_folder, exist_ok=True)
     return results_folder
 
-def analyze_drone_image():
-    # Your image URL
-    image_url = "https://obj3423.public-dk6.clu4.obj.storagefactory.io/dev-poc-drone-images/Chat/Testpulje/uploaded/DJI_0942.JPG"
-    
+# Held while a status line is written; see say()
+_print_lock = threading.Lock()
+
+def say(line: str) -> None:
+    """Print one status line in a single write, so lines from images analyzed side by side never run together."""
+    with _print_lock:
+        sys.stdout.write(f"{line}\n")
+        sys.stdout.flush()
+
+def annotate_in_background(annotator: ThreadPoolExecutor, image_path: str, results_folder: str,
+                           cracks: list) -> None:
+    """Queue drawing cracks onto image_path; the outcome is printed when it is done.
+
+    cracks is the list find_cracks() took from the reply, whatever key it came under,
+    passed in memory so the annotator does not re-read the analysis JSON just written.
+    """
+    from annotate_bboxes_from_url import annotate_file  # imports this module, so not at the top
+
+    def report(future: Future) -> None:
+        try:
+            output_image, count = future.result()
+        except Exception as e:
+            say(f"✗ Failed to annotate {image_path}: {e}")
+            return
+        say(f"✓ Annotated {count} crack(s) -> {output_image}")
+
+    annotator.submit(annotate_file, image_path, results_folder, data={"cracks": cracks}).add_done_callback(report)
+
+def analyze_drone_image(image_url: str = DEFAULT_IMAGE_URL, results_folder: str = "results",
+                        verbose: bool = False, ollama_slots: threading.Semaphore | None = None,
+                        max_side: int = MAX_IMAGE_SIDE, prefetched: Future | None = None,
+                        model: str = CHAT_PAYLOAD["model"], annotator: ThreadPoolExecutor | None = None,
+                        use_cache: bool = True):
+    """Analyze one image with Ollama and save its findings; returns the parsed findings or None.
+
+    verbose echoes the raw reply live and the indented findings to stdout; otherwise
+    the raw reply goes to <name>_raw.json in the results folder. ollama_slots,
+    when given, is held only around the chat request so downloads of other
+    images keep running while this one waits for or occupies the model.
+    max_side bounds the resolution sent to the model (0 sends the original).
+    prefetched is a Future of fetch_image_base64 for this image already under way.
+    model is the Ollama model tag to run. annotator, when given, draws the
+    found cracks onto the image in the background (see annotate_in_background).
+    use_cache reuses and fills the download cache in IMAGE_CACHE_DIR.
+    """
     # Create results folder
-    results_folder = create_results_folder()
+    create_results_folder(results_folder)
     base_filename = get_filename_from_url(image_url)
     
-    print("Downloading image...")
-    # Download and convert to base64
+    say("Downloading image...")
+    # Download to the results folder and convert to base64 in one pass
     try:
-        response = requests.get(image_url, timeout=30)
-        response.raise_for_status()
-        image_data = response.content
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        print(f"✓ Image downloaded successfully ({len(image_base64)} bytes)")
-        
-        # Save image to results folder
         image_path = os.path.join(results_folder, f"{base_filename}.JPG")
-        with open(image_path, "wb") as f:
-            f.write(image_data)
-        print(f"✓ Image saved to: {image_path}")
+        if prefetched is not None:
+            image_base64, from_cache = prefetched.result()
+        else:
+            image_base64, from_cache = fetch_image_base64(image_url, image_path, use_cache=use_cache,
+                                                          max_side=max_side)
+        if from_cache:
+            say(f"✓ Image loaded from cache ({len(image_base64)} bytes)")
+        else:
+            say(f"✓ Image downloaded successfully ({len(image_base64)} bytes)")
+        say(f"✓ Image saved to: {image_path}")
         
     except Exception as e:
-        print(f"✗ Failed to download image: {e}")
+        say(f"✗ Failed to download image: {e}")
         return
     
-    # Prepare Ollama API request
-    ollama_url = "http://localhost:11434/api/chat"
+    ollama_url = f"{OLLAMA_URL}/api/chat"
     
-    payload = {
-        "model": "llava:13b",
-        "messages": [
-            {
-                "role": "system",
-                "content": (
-                    "You are an experienced architect inspecting structures from drone imagery. "
-                    "Analyze images for structural issues, cracks, mortar problems, water damage, "
-                    "and any defects. Be specific about locations and severity."                  
-                )
-            },
-            {
-                "role": "user",
-                "content": (
-                    "You are inspecting a brick wall for structural defects. Scan EVERY part of the image systematically and identify ALL visible issues:\n"
-                    "- Cracks (hairline, vertical, horizontal, diagonal)\n"
-                    "- Mortar erosion or gaps in joints\n"
-                    "- Spalled or damaged bricks\n"
-                    "- Color variations indicating water damage\n"
-                    "- Any irregularities in the brickwork\n\n"
-                    
-                    "CRITICAL INSTRUCTIONS:\n"
-                    "1. Each defect needs its OWN SMALL bounding box - draw tight boxes around individual cracks, not large areas\n"
-                    "2. If you see 5 different cracks, create 5 separate bounding boxes\n"
-                    "3. Small cracks should have small boxes (width/height around 0.02-0.10)\n"
-                    "4. DO NOT create one large box covering multiple defects\n\n"
-                    
-                    "OUTPUT FORMAT - You MUST return EXACTLY 5 values in bbox_2d array:\n"
-                    "\"bbox_2d\": [0, x_center, y_center, width, height]\n\n"
-                    
-                    "Where:\n"
-                    "- First value is ALWAYS 0 (class_id for crack)\n"
-                    "- x_center: horizontal center of the crack (0.0=left edge, 1.0=right edge)\n"
-                    "- y_center: vertical center of the crack (0.0=top, 1.0=bottom)\n"
-                    "- width: crack width as fraction of image (typically 0.02-0.10 for thin cracks)\n"
-                    "- height: crack height as fraction of image (typically 0.02-0.10 for small cracks)\n\n"
-                    
-                    "EXAMPLE of correct format:\n"
-                    "{\n"
-                    "  \"cracks\": [\n"
-                    "    {\"bbox_2d\": [0, 0.356, 0.568, 0.076, 0.026], \"description\": \"horizontal hairline crack in mortar joint\"},\n"
-                    "    {\"bbox_2d\": [0, 0.291, 0.473, 0.033, 0.014], \"description\": \"faint horizontal mortar erosion\"},\n"
-                    "    {\"bbox_2d\": [0, 0.371, 0.457, 0.035, 0.018], \"description\": \"slight vertical mortar separation\"}\n"
-                    "  ]\n"
-                    "}\n\n"
-                    
-                    "Return ONLY valid JSON - no extra text. If you find nothing, return {\"cracks\": []}.\n"
-                    "⚠️ Be thorough - typical drone images have 5-15 detectable defects."
-                ),
-                "images": [image_base64]
-            }
-        ],
-        "format": "json",
-        "stream": False,
-        "options": {
-            "temperature": 0.3,
-            "top_p": 0.9
-        }
-    }
-    
-    print("\nSending request to Ollama (llava model)...")
-    print("This may take 30-60 seconds depending on your hardware...\n")
+    say(f"\nSending request to Ollama ({model} model)...")
+    say("This may take 30-60 seconds depending on your hardware...\n")
     
     try:
-        response = requests.post(ollama_url, json=payload, timeout=180)
-        response.raise_for_status()
-        result = response.json()
-        
-        # Extract content
-        content = result.get("message", {}).get("content", "")
+        body = build_chat_body(image_base64, model)
+        if verbose:
+            say(f"  Request body: {len(body)} bytes")
+        with ollama_slots or contextlib.nullcontext():
+            with SESSION.post(
+                ollama_url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=180,
+                stream=True
+            ) as response:
+                if response.status_code == 404:
+                    # Ollama answers 404 when the model is not installed
+                    try:
+                        error = json_loads(response.content).get("error")
+                    except ValueError:
+                        error = None
+                    say(f"✗ {error or f'Model {model} not found'}")
+                    say(f"  Install it with: ollama pull {model}")
+                    return
+                response.raise_for_status()
+                if verbose:
+                    # Echo the reply token by token instead of after the last one
+                    content = read_streamed_content(
+                        response,
+                        on_token=lambda token: print(token, end="", flush=True)
+                    )
+                    say("")
+                else:
+                    content = read_streamed_content(
+                        response,
+                        on_crack=lambda n, crack: say(f"  … crack {n}: {crack.get('description', '')}")
+                    )
         
-        print("=" * 70)
-        print("ANALYSIS RESULT")
-        print("=" * 70)
-        print(content)
+        say("=" * 70)
+        say("ANALYSIS RESULT")
+        say("=" * 70)
+        # The raw reply can be many KB; slow consoles only get it in verbose mode
+        if not verbose:
+            raw_output_file = os.path.join(results_folder, f"{base_filename}_raw.json")
+            Path(raw_output_file).write_bytes(content.encode("utf-8"))
+            say(f"✓ Saved raw response to: {raw_output_file}")
         
-        # Try to parse and pretty-print JSON
+        # Try to parse JSON; the indented form is serialized once for screen and file
         try:
-            findings = json.loads(content)
-            print("\n" + "=" * 70)
-            print("FORMATTED FINDINGS")
-            print("=" * 70)
-            print(json.dumps(findings, indent=2))
+            findings = json_loads(content)
+            pretty = json_dumps_bytes(findings, indent=True)
+            if verbose:
+                say("\n" + "=" * 70)
+                say("FORMATTED FINDINGS")
+                say("=" * 70)
+                say(pretty.decode("utf-8"))
             
             # Display summary and save YOLO labels
             if isinstance(findings, dict):
-                cracks = findings.get("cracks", []) or findings.get("boxes", [])
+                cracks = find_cracks(findings)
                 if cracks:
-                    print(f"\n✓ Found {len(cracks)} crack(s)")
-                    
-                    # Generate output filename based on image URL
-                    base_filename = get_filename_from_url(image_url)
+                    say(f"\n✓ Found {len(cracks)} crack(s)")
                     
-                    # Save in YOLO format to results folder
+                    # YOLO labels, class names and the JSON for reference are
+                    # serialized first and written back to back
                     output_file = os.path.join(results_folder, f"{base_filename}.txt")
-                    save_yolo_labels(cracks, output_file)
-                    
-                    # Save YOLO classes file
                     classes_file = os.path.join(results_folder, "classes.txt")
-                    save_yolo_classes(classes_file)
-                    
-                    # Also save JSON for reference
                     json_output_file = os.path.join(results_folder, f"{base_filename}_analysis.json")
-                    with open(json_output_file, "w", encoding="utf-8") as f:
-                        json.dump(findings, f, indent=2)
-                    print(f"✓ Saved detailed analysis to: {json_output_file}")
+                    labels = format_yolo_labels(cracks)
+                    outputs = {output_file: labels, classes_file: YOLO_CLASSES_BYTES, json_output_file: pretty}
+                    for path, blob in outputs.items():
+                        Path(path).write_bytes(blob)
+                    say(f"✓ Saved {labels.count(NEWLINE)} crack(s) to: {output_file}")
+                    say(f"✓ Saved class definitions to: {classes_file}")
+                    say(f"✓ Saved detailed analysis to: {json_output_file}")
                     
-                    print(f"\n📁 All files saved to: {results_folder}/")
-                    print("\n" + "=" * 70)
-                    print("NEXT STEP: Annotate the image with bounding boxes")
-                    print("=" * 70)
-                    print(f"Run: python annotate_bboxes_from_url.py \\")
-                    print(f"       --file \"{image_path}\" \\")
-                    print(f"       --json-file \"{json_output_file}\" \\")
-                    print(f"       --out \"annotated_{base_filename}.jpg\" \\")
-                    print(f"       --export-yolo \"{base_filename}_yolo.txt\"")
+                    say(f"\n📁 All files saved to: {results_folder}/")
+                    if annotator is not None:
+                        annotate_in_background(annotator, image_path, results_folder, cracks)
+                    else:
+                        say("\n" + "=" * 70)
+                        say("NEXT STEP: Annotate the image with bounding boxes")
+                        say("=" * 70)
+                        say(f"Run: python annotate_bboxes_from_url.py \\")
+                        say(f"       --file \"{image_path}\" \\")
+                        say(f"       --json-file \"{json_output_file}\" \\")
+                        say(f"       --out \"annotated_{base_filename}.jpg\" \\")
+                        if results_folder != "results":
+                            say(f"       --results-folder \"{results_folder}\" \\")
+                        say(f"       --export-yolo \"{base_filename}_yolo.txt\"")
                 else:
-                    print("\n✓ No cracks detected")
+                    say("\n✓ No cracks detected")
                 
                 if "findings" in findings:
-                    print(f"✓ Found {len(findings['findings'])} issue(s)")
+                    say(f"✓ Found {len(findings['findings'])} issue(s)")
                 if "overall_assessment" in findings:
-                    print(f"✓ Assessment: {findings['overall_assessment']}")
+                    say(f"✓ Assessment: {findings['overall_assessment']}")
+            
+            return findings
                     
         except json.JSONDecodeError:
-            print("\n(Note: Response is not in JSON format)")
-            print("Cannot save YOLO labels - invalid JSON response")
+            say("\n(Note: Response is not in JSON format)")
+            say("Cannot save YOLO labels - invalid JSON response")
             
     except requests.exceptions.Timeout:
-        print("✗ Request timed out. The image might be too large or Ollama is slow.")
+        say("✗ Request timed out. The image might be too large or Ollama is slow.")
     except requests.exceptions.ConnectionError:
-        print("✗ Cannot connect to Ollama. Make sure it's running on http://localhost:11434")
-        print("  Run: ollama serve")
+        say(f"✗ Cannot connect to Ollama. Make sure it's running on {OLLAMA_URL}")
+        say("  Run: ollama serve")
     except Exception as e:
-        print(f"✗ Error: {e}")
+        say(f"✗ Error: {e}")
+
+def analyze_drone_images(image_urls: list, max_workers: int = 2, results_folder: str = "results",
+                         verbose: bool = False, max_side: int = MAX_IMAGE_SIDE,
+                         model: str = CHAT_PAYLOAD["model"], annotate: bool = False,
+                         use_cache: bool = True) -> list:
+    """Analyze several images concurrently; results are returned in input order.
+
+    At most max_workers chat requests are in flight, while one extra worker
+    is already downloading and encoding the next image so Ollama is never
+    left waiting on the network. The Ollama server only decodes requests side
+    by side when started with OLLAMA_NUM_PARALLEL >= max_workers (and
+    OLLAMA_MAX_LOADED_MODELS if more than one model is in use); otherwise the
+    extra requests simply queue and only the downloads overlap.
+    With annotate, each image with cracks is drawn on by a background thread
+    while the model works on the next one; all drawing is done on return.
+    """
+    probe_ollama()
+    threading.Thread(target=warm_up_model, args=(model,), daemon=True).start()
+    ollama_slots = threading.Semaphore(max_workers)
+    with ThreadPoolExecutor(max_workers=1) if annotate else contextlib.nullcontext() as annotator:
+        analyze = functools.partial(analyze_drone_image, results_folder=results_folder,
+                                    verbose=verbose, ollama_slots=ollama_slots, max_side=max_side,
+                                    model=model, annotator=annotator, use_cache=use_cache)
+        with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+            return list(executor.map(analyze, image_urls))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze drone images with Ollama and save cracks in YOLO format")
+    sources = parser.add_mutually_exclusive_group()
+    sources.add_argument("--urls", nargs="+", default=[DEFAULT_IMAGE_URL], help="Image URLs to analyze")
+    sources.add_argument("--urls-file", help="Text file with one image URL per line (# starts a comment)")
+    parser.add_argument("--model", default=CHAT_PAYLOAD["model"], help=f"Ollama vision model (default: {CHAT_PAYLOAD['model']})")
+    parser.add_argument("--quant", choices=QUANTIZATIONS,
+                        help="Quantized variant of --model: q4_0/q4_K_M are fastest and smallest, "
+                             "q8_0 and fp16 are slower but closer to the full-precision output")
+    parser.add_argument("--yes", action="store_true", help="Continue without prompting when the model is not installed")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Chat requests in flight for several --urls; match Ollama's OLLAMA_NUM_PARALLEL (default: 2)")
+    parser.add_argument("--results-folder", default="results",
+                        help="Folder the image, labels and analysis are written to directly (default: results)")
+    parser.add_argument("--annotate", action="store_true",
+                        help="Draw the cracks onto each image (annotated_<name>.JPG) while the next one is analyzed")
+    parser.add_argument("--max-side", type=int, default=MAX_IMAGE_SIDE,
+                        help=f"Shrink images to this longest side before sending them to the model; "
+                             f"0 sends the original file (default: {MAX_IMAGE_SIDE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Always download the images instead of reusing or filling the {IMAGE_CACHE_DIR}/ copies")
+    parser.add_argument("--verbose", action="store_true", help="Print the indented findings for each image")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.max_side < 0:
+        parser.error("--max-side must be 0 (original size) or a positive number of pixels")
+    model = resolve_model_name(args.model, args.quant)
+    if args.urls_file:
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            args.urls = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+        if not args.urls:
+            print(f"✗ No URLs found in {args.urls_file}")
+            sys.exit(1)
+    
     print("=" * 70)
-    print("DRONE IMAGE ANALYSIS - DJI_0942.JPG")
+    if len(args.urls) == 1:
+        base_filename = get_filename_from_url(args.urls[0])
+        print(f"DRONE IMAGE ANALYSIS - {base_filename}.JPG")
+    else:
+        print(f"DRONE IMAGE ANALYSIS - {len(args.urls)} images")
     print("=" * 70)
     print()
     
+    # A single image downloads while Ollama is probed; batches overlap downloads anyway
+    if len(args.urls) == 1:
+        image_path = os.path.join(create_results_folder(args.results_folder), f"{base_filename}.JPG")
+        prefetched = run_in_daemon_thread(fetch_image_base64, args.urls[0], image_path, not args.no_cache,
+                                          args.max_side)
+    
     # Check if Ollama is running
     try:
-        health_check = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if health_check.status_code == 200:
-            models = health_check.json().get("models", [])
-            model_names = [m.get("name") for m in models]
-            print(f"✓ Ollama is running")
-            print(f"✓ Available models: {', '.join(model_names)}")
-            
-            if not any("llava" in name for name in model_names):
-                print("\n⚠ WARNING: llava model not found!")
-                print("  Install it with: ollama pull llava")
-                response = input("\nContinue anyway? (y/n): ")
-                if response.lower() != 'y':
-                    exit(0)
-            print()
-    except:
+        probe_ollama()
+    except OSError:
         print("✗ Cannot connect to Ollama")
         print("  Make sure Ollama is running: ollama serve")
-        print("  And llava model is installed: ollama pull llava")
-        exit(1)
+        print(f"  And the model is installed: ollama pull {model}")
+        sys.exit(1)
+    
+    print(f"✓ Ollama is running")
+    
+    # The model list is only fetched for a non-default model; a missing
+    # default model is reported by the chat request itself
+    if model != CHAT_PAYLOAD["model"]:
+        try:
+            model_names = check_ollama()
+        except Exception as e:
+            print(f"✗ Cannot list Ollama models: {e}")
+            sys.exit(1)
+        print(f"✓ Available models: {', '.join(model_names)}")
+        
+        if model not in model_names and f"{model}:latest" not in model_names:
+            print(f"\n⚠ WARNING: {model} model not found!")
+            print(f"  Install it with: ollama pull {model}")
+            if not args.yes:
+                print("  Or re-run with --yes to continue anyway")
+                sys.exit(1)
+    print()
     
-    analyze_drone_image()
\ No newline at end of file
+    if len(args.urls) == 1:
+        # Load the model while the image downloads; analyze_drone_images does its own
+        threading.Thread(target=warm_up_model, args=(model,), daemon=True).start()
+        with ThreadPoolExecutor(max_workers=1) if args.annotate else contextlib.nullcontext() as annotator:
+            analyze_drone_image(args.urls[0], results_folder=args.results_folder, verbose=args.verbose,
+                                max_side=args.max_side, prefetched=prefetched, model=model,
+                                annotator=annotator, use_cache=not args.no_cache)
+    else:
+        analyze_drone_images(args.urls, max_workers=args.workers, results_folder=args.results_folder,
+                             verbose=args.verbose, max_side=args.max_side, model=model,
+                             annotate=args.annotate, use_cache=not args.no_cache)
@@ -8,7 +8,7 @@ Supported formats:
   - YOLO txt: cls xc yc w h (0..1)
   - YOLO JSON: {"boxes": [{"bbox_2d": [cls, xc, yc, w, h], ...}]} or {"cracks": [...]}
 
-Dependencies: pillow, requests
+Dependencies: pillow, requests (numpy optional, for batch conversions)
     pip install pillow requests
 
 Usage examples:
@@ -27,15 +27,28 @@ Usage examples:
 
 from __future__ import annotations
 import argparse
+import glob
 import io
 import json
 import sys
 import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import List, Dict, Any, Tuple
 
-import requests
+import PIL
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    import numpy as np
+except ImportError:  # optional: box conversions fall back to per-box Python
+    np = None
+
+from analyze_drone_image import (IMAGE_CACHE_DIR, SESSION, YOLO_ROW_TEMPLATE, _atomic_path, cached_image_path,
+                                 download_image_base64, find_cracks, json_loads, save_yolo_classes)
+
 # --- Defaults ---
 DEFAULT_IMAGE_URL = (
     "https://obj3423.public-dk6.clu4.obj.storagefactory.io/dev-poc-drone-images/Chat/"
@@ -55,16 +68,45 @@ DEFAULT_DATA = {
     ]
 }
 
+# JPEG quality of the annotated image; Pillow's optimize/progressive passes stay off for a single-pass encode
+# unless --optimize asks for smaller files
+JPEG_QUALITY = 95
+
 # ---------------- Image Loading ----------------
 
-def load_image_from_url(url: str) -> Image.Image:
-    resp = requests.get(url, timeout=30)
+def pillow_build() -> str:
+    """Describe the installed Pillow; Pillow-SIMD releases carry a ".postN" suffix."""
+    version = PIL.__version__
+    return f"Pillow-SIMD {version}" if ".post" in version else f"Pillow {version} (pillow-simd not installed)"
+
+
+def load_image_from_url(url: str, use_cache: bool = True) -> Image.Image:
+    """Load an image from url, reusing the download cache shared with analyze_drone_image.py."""
+    if use_cache:
+        cached = cached_image_path(url)
+        try:
+            return load_image_from_file(cached)
+        except FileNotFoundError:
+            pass
+        IMAGE_CACHE_DIR.mkdir(exist_ok=True)
+        with _atomic_path(cached) as tmp_path:
+            download_image_base64(url, tmp_path, encode=False)
+        return load_image_from_file(cached)
+
+    # Pillow needs a seekable file, so the body is taken whole; BytesIO shares the bytes without copying
+    resp = SESSION.get(url, timeout=30)
     resp.raise_for_status()
-    return Image.open(io.BytesIO(resp.content)).convert("RGB")
+    return _as_rgb(Image.open(io.BytesIO(resp.content)))
 
 
 def load_image_from_file(path: str) -> Image.Image:
-    return Image.open(path).convert("RGB")
+    return _as_rgb(Image.open(path))
+
+
+def _as_rgb(img: Image.Image) -> Image.Image:
+    """Decode img and return it in RGB, without copying images that already are (most JPEGs)."""
+    img.load()
+    return img if img.mode == "RGB" else img.convert("RGB")
 
 
 # ---------------- Coordinate Conversions ----------------
@@ -122,8 +164,35 @@ def yolo_norm_to_qwen1000(xc: float, yc: float, w: float, h: float) -> Tuple[flo
 
 # ---------------- Label File Readers ----------------
 
+def _read_labels_array(path: str):
+    """Parse a 5-column label file with numpy's C parser into (classes, coords).
+
+    classes is a list of ints and coords a list of [a, b, c, d] float rows,
+    split column-wise in C so the readers only wrap them in dicts. Returns
+    None if numpy is missing or the file is irregular.
+    """
+    if np is None:
+        return None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # loadtxt warns on empty files
+            data = np.loadtxt(path, dtype=np.float64, comments="#", ndmin=2)
+    except ValueError:
+        return None  # ragged or non-numeric lines: leave them to the tolerant parser
+    if data.size and data.shape[1] != 5:
+        return None
+    return data[:, 0].astype(np.int64).tolist(), data[:, 1:].tolist()
+
+
 def read_qwen_labels(path: str) -> List[Dict[str, Any]]:
     """Read Qwen-1000 labels: each line: cls x1 y1 x2 y2 (all 0..1000)."""
+    parsed = _read_labels_array(path)
+    if parsed is not None:
+        return [
+            {"bbox_2d": box, "class": cls, "description": "qwen_label", "format": "qwen"}
+            for cls, box in zip(*parsed)
+        ]
+
     out: List[Dict[str, Any]] = []
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
@@ -145,6 +214,13 @@ def read_qwen_labels(path: str) -> List[Dict[str, Any]]:
 
 def read_yolo_labels(path: str) -> List[Dict[str, Any]]:
     """Read YOLO labels: each line: cls xc yc w h (all normalized 0..1)."""
+    parsed = _read_labels_array(path)
+    if parsed is not None:
+        return [
+            {"yolo": box, "class": cls, "description": "yolo_label", "format": "yolo"}
+            for cls, box in zip(*parsed)
+        ]
+
     out: List[Dict[str, Any]] = []
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
@@ -174,6 +250,9 @@ def parse_items_from_json(data: Dict[str, Any]) -> List[Dict[str, Any]]:
         box_lists.append(data["boxes"])
     if "cracks" in data and isinstance(data["cracks"], list):
         box_lists.append(data["cracks"])
+    if not box_lists:
+        # The model renamed the key (e.g. "defects"); take what the analyzer would
+        box_lists.append(find_cracks(data))
     
     for box_list in box_lists:
         for el in box_list:
@@ -195,13 +274,12 @@ def parse_items_from_json(data: Dict[str, Any]) -> List[Dict[str, Any]]:
                     "format": "yolo"
                 })
             elif len(bbox) == 4:
-                # Check if it's YOLO (0..1) or Qwen-1000 (0..1000)
-                max_val = max(map(float, bbox))
-                if max_val <= 1.0:
+                # Check if it's YOLO (0..1) or Qwen-1000 (0..1000); convert once for both the check and the item
+                vals = [float(v) for v in bbox]
+                if max(vals) <= 1.0:
                     # YOLO format without class: [xc, yc, w, h]
-                    xc, yc, w, h = map(float, bbox)
                     items.append({
-                        "yolo": [xc, yc, w, h],
+                        "yolo": vals,
                         "class": el.get("class", 0),
                         "description": el.get("description", "bbox"),
                         "format": "yolo"
@@ -209,7 +287,7 @@ def parse_items_from_json(data: Dict[str, Any]) -> List[Dict[str, Any]]:
                 else:
                     # Qwen-1000 format: [x1, y1, x2, y2]
                     items.append({
-                        "bbox_2d": [float(v) for v in bbox],
+                        "bbox_2d": vals,
                         "class": el.get("class", 0),
                         "description": el.get("description", "bbox"),
                         "format": "qwen"
@@ -218,143 +296,278 @@ def parse_items_from_json(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     return items
 
 
+# ---------------- Box Sets ----------------
+
+@dataclass
+class BoxSet:
+    """Validated boxes in structure-of-arrays form, shared by drawing and export.
+
+    coords rows are YOLO [xc, yc, w, h] where is_yolo is set and Qwen-1000
+    [x1, y1, x2, y2] otherwise. indices are the 1-based positions of the boxes
+    in the source items, so skipped items keep the label numbering.
+    """
+    indices: List[int] = field(default_factory=list)
+    classes: List[Any] = field(default_factory=list)
+    descriptions: List[str] = field(default_factory=list)
+    coords: List[Tuple[float, float, float, float]] = field(default_factory=list)
+    is_yolo: List[bool] = field(default_factory=list)
+    # Converted views, computed on first use and shared by drawing and every export
+    _views: Dict[Any, list] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]]) -> "BoxSet":
+        """Validate parsed items once; items without a usable box are dropped."""
+        boxes = cls()
+        for idx, item in enumerate(items, start=1):
+            fmt = item.get("format", "yolo")
+            
+            if fmt == "yolo":
+                yolo_data = item.get("yolo")
+                if not yolo_data or len(yolo_data) != 4:
+                    continue
+                coords = tuple(map(float, yolo_data))
+                box_cls = item.get("class", 0)
+            else:  # qwen format
+                arr = item.get("bbox_2d")
+                if not arr or len(arr) < 4:
+                    continue
+                if len(arr) >= 5:
+                    coords = tuple(map(float, arr[1:5]))
+                    box_cls = int(float(arr[0]))
+                else:
+                    coords = tuple(map(float, arr[0:4]))
+                    box_cls = item.get("class", 0)
+            boxes.indices.append(idx)
+            boxes.classes.append(box_cls)
+            boxes.descriptions.append(item.get("description") or "bbox")
+            boxes.coords.append(coords)
+            boxes.is_yolo.append(fmt == "yolo")
+        return boxes
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def _converted(self, convert, rows_to_convert: List[bool]) -> List[Tuple[float, float, float, float]]:
+        """Apply a coordinate conversion to the flagged rows, as one array operation when numpy is available."""
+        if np is not None and any(rows_to_convert):
+            arr = np.asarray(self.coords, dtype=np.float64)
+            mask = np.asarray(rows_to_convert)
+            arr[mask] = np.column_stack(convert(*arr[mask].T))
+            return arr.tolist()
+        return [convert(*box) if flagged else box for box, flagged in zip(self.coords, rows_to_convert)]
+
+    def to_yolo(self) -> List[Tuple[float, float, float, float]]:
+        """Return every box as YOLO-normalized [xc, yc, w, h]."""
+        if "yolo" not in self._views:
+            self._views["yolo"] = self._converted(qwen1000_to_yolo_norm, [not yolo for yolo in self.is_yolo])
+        return self._views["yolo"]
+
+    def to_qwen(self) -> List[Tuple[float, float, float, float]]:
+        """Return every box as Qwen-1000 corners [x1, y1, x2, y2]."""
+        if "qwen" not in self._views:
+            self._views["qwen"] = self._converted(yolo_norm_to_qwen1000, self.is_yolo)
+        return self._views["qwen"]
+
+    def to_pixels(self, img_w: int, img_h: int) -> List[Tuple[int, int, int, int]]:
+        """Return clamped pixel corners for every box, cached per image size."""
+        key = ("pixels", img_w, img_h)
+        if key not in self._views:
+            self._views[key] = self._pixels(img_w, img_h)
+        return self._views[key]
+
+    def _pixels(self, img_w: int, img_h: int) -> List[Tuple[int, int, int, int]]:
+        """Convert every box to clamped pixel corners.
+
+        All boxes are converted together as one (N, 4) array when numpy is
+        available; the results match the per-box conversion functions exactly.
+        """
+        if np is None or not self.coords:
+            return [
+                yolo_norm_to_pixels(*coords, img_w, img_h) if yolo
+                else qwen1000_corners_to_pixels(*coords, img_w, img_h)
+                for coords, yolo in zip(self.coords, self.is_yolo)
+            ]
+
+        coords = np.asarray(self.coords, dtype=np.float64)
+        xc, yc, w, h = coords.T
+        X_center, Y_center = xc * img_w, yc * img_h
+        W, H = w * img_w, h * img_h
+        yolo_px = np.column_stack((X_center - W / 2.0, Y_center - H / 2.0, X_center + W / 2.0, Y_center + H / 2.0))
+        sx, sy = img_w / 1000.0, img_h / 1000.0
+        qwen_px = coords * (sx, sy, sx, sy)
+        px = np.round(np.where(np.asarray(self.is_yolo)[:, None], yolo_px, qwen_px))
+        np.clip(px, 0, (img_w - 1, img_h - 1, img_w - 1, img_h - 1), out=px)
+        return [tuple(box) for box in px.astype(np.int64).tolist()]
+
+
+def as_box_set(items) -> BoxSet:
+    """Accept either parsed items or an existing BoxSet."""
+    return items if isinstance(items, BoxSet) else BoxSet.from_items(items)
+
+
 # ---------------- Drawing ----------------
 
-def draw_boxes(img: Image.Image, items: List[Dict[str, Any]], box_width: int = 3,
+# Label font, parsed on first use and then reused for every image in the process
+_FONT = None
+
+
+def _get_font():
+    """Return the label font, loading DejaVuSans (or Pillow's default) the first time."""
+    global _FONT
+    if _FONT is None:
+        try:
+            _FONT = ImageFont.truetype("DejaVuSans.ttf", 16)
+        except Exception:
+            _FONT = ImageFont.load_default()
+    return _FONT
+
+# Advance width of each character in the label font, filled on first use
+_ADVANCES: Dict[str, float] = {}
+
+
+def set_font(path: str, size: int = 16) -> None:
+    """Use another TrueType font for labels from now on (raises OSError if it cannot be loaded)."""
+    global _FONT
+    _FONT = ImageFont.truetype(path, size)
+    _ADVANCES.clear()
+
+
+def label_width(text: str) -> float:
+    """Return the width of text in the label font by summing cached per-character advances.
+
+    Kerning is ignored, which can only make the label background a fraction
+    of a pixel wider; it avoids a FreeType layout pass for every box.
+    """
+    try:
+        return sum(_ADVANCES[c] for c in text)
+    except KeyError:
+        font = _get_font()
+        for c in set(text).difference(_ADVANCES):
+            _ADVANCES[c] = font.getlength(c)
+        return sum(_ADVANCES[c] for c in text)
+
+
+def draw_boxes(img: Image.Image, items: List[Dict[str, Any]] | BoxSet, box_width: int = 3,
                box_color=(255, 0, 0), text_bg=(255, 255, 255), text_color=(0, 0, 0)) -> Image.Image:
     """Draw boxes from items (supports both Qwen-1000 and YOLO formats)."""
     draw = ImageDraw.Draw(img)
-    try:
-        font = ImageFont.truetype("DejaVuSans.ttf", 16)
-    except Exception:
-        font = ImageFont.load_default()
+    font = _get_font()
 
     img_w, img_h = img.size
+    boxes = as_box_set(items)
 
-    for idx, item in enumerate(items, start=1):
-        fmt = item.get("format", "yolo")
-        
-        if fmt == "yolo":
-            yolo_data = item.get("yolo")
-            if not yolo_data or len(yolo_data) != 4:
-                continue
-            xc, yc, w, h = map(float, yolo_data)
-            X1, Y1, X2, Y2 = yolo_norm_to_pixels(xc, yc, w, h, img_w, img_h)
-            cls = item.get("class", 0)
-        else:  # qwen format
-            arr = item.get("bbox_2d")
-            if not arr or len(arr) < 4:
-                continue
-            if len(arr) >= 5:
-                x1, y1, x2, y2 = map(float, arr[1:5])
-                cls = int(float(arr[0]))
-            else:
-                x1, y1, x2, y2 = map(float, arr[0:4])
-                cls = item.get("class", 0)
-            X1, Y1, X2, Y2 = qwen1000_corners_to_pixels(x1, y1, x2, y2, img_w, img_h)
-
-        # Draw box
-        for o in range(box_width):
-            draw.rectangle([X1 - o, Y1 - o, X2 + o, Y2 + o], outline=box_color)
-
-        # Draw label
-        desc = item.get("description") or "bbox"
+    corners = boxes.to_pixels(img_w, img_h)
+
+    # Draw boxes; width= thickens inward, so grow the bounds to keep the outline outside the box
+    grow = box_width - 1
+    for X1, Y1, X2, Y2 in corners:
+        draw.rectangle([X1 - grow, Y1 - grow, X2 + grow, Y2 + grow], outline=box_color, width=box_width)
+
+    # Draw labels in a second pass so no outline is painted over a label
+    th = font.size + 6
+    text_dy = (th - font.size) // 2 - 1
+    for idx, cls, desc, (X1, Y1, _, _) in zip(boxes.indices, boxes.classes, boxes.descriptions, corners):
         label = f"{idx}: {desc}"
         if cls is not None:
             label = f"{idx}: cls={cls} {desc}"
-        
-        tw, th = draw.textlength(label, font=font), font.size + 6
+
+        tw = label_width(label)
         lx, ly = X1, max(0, Y1 - th - 2)
         draw.rectangle([lx, ly, lx + tw + 8, ly + th], fill=text_bg)
-        draw.text((lx + 4, ly + (th - font.size) // 2 - 1), label, fill=text_color, font=font)
+        draw.text((lx + 4, ly + text_dy), label, fill=text_color, font=font)
 
     return img
 
 
 # ---------------- Export Functions ----------------
 
-def save_yolo_classes(output_path: str) -> None:
-    """Save YOLO classes.txt file with class names."""
-    classes = [
-        "crack",
-        "spalling",
-        "mortar_erosion",
-        "water_damage",
-        "displacement",
-        "efflorescence",
-        "hole",
-        "deformation"
-    ]
-    
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(classes))
-        f.write("\n")
+# One Qwen-1000 label line; repeated per row and %-formatted into bytes in one call
+QWEN_ROW_TEMPLATE = b"%d %.2f %.2f %.2f %.2f\n"
 
-def export_yolo(items: List[Dict[str, Any]], out_path: str) -> None:
-    """Write YOLO-normalized labels (cls xc yc w h)."""
-    lines: List[str] = []
-    for it in items:
-        fmt = it.get("format", "yolo")
-        cls = int(it.get("class", 0))
-        
-        if fmt == "yolo":
-            yolo_data = it.get("yolo")
-            if not yolo_data or len(yolo_data) != 4:
-                continue
-            xc, yc, w, h = map(float, yolo_data)
-        else:  # qwen format
-            arr = it.get("bbox_2d")
-            if not arr or len(arr) < 4:
-                continue
-            if len(arr) >= 5:
-                x1, y1, x2, y2 = map(float, arr[1:5])
-            else:
-                x1, y1, x2, y2 = map(float, arr[0:4])
-            xc, yc, w, h = qwen1000_to_yolo_norm(x1, y1, x2, y2)
-        
-        lines.append(f"{cls} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}")
 
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + ("\n" if lines else ""))
+def export_yolo(items: List[Dict[str, Any]] | BoxSet, out_path: str) -> None:
+    """Write YOLO-normalized labels (cls xc yc w h)."""
+    boxes = as_box_set(items)
+    rows = (v for cls, box in zip(boxes.classes, boxes.to_yolo()) for v in (int(cls), *box))
+    Path(out_path).write_bytes((YOLO_ROW_TEMPLATE * len(boxes)) % tuple(rows))
 
 
-def export_qwen(items: List[Dict[str, Any]], out_path: str) -> None:
+def export_qwen(items: List[Dict[str, Any]] | BoxSet, out_path: str) -> None:
     """Write Qwen-1000 labels (cls x1 y1 x2 y2)."""
-    lines: List[str] = []
-    for it in items:
-        fmt = it.get("format", "yolo")
-        cls = int(it.get("class", 0))
-        
-        if fmt == "yolo":
-            yolo_data = it.get("yolo")
-            if not yolo_data or len(yolo_data) != 4:
+    boxes = as_box_set(items)
+    rows = (v for cls, box in zip(boxes.classes, boxes.to_qwen()) for v in (int(cls), *box))
+    Path(out_path).write_bytes((QWEN_ROW_TEMPLATE * len(boxes)) % tuple(rows))
+
+
+# ---------------- Batch Annotation ----------------
+
+def save_annotated(img: Image.Image, path: str, quality: int = JPEG_QUALITY, optimize: bool = False) -> None:
+    """Save an annotated image; optimize adds Huffman-table optimization and progressive scans.
+
+    That makes JPEGs roughly 5-15% smaller for upload, at the cost of a slower encode.
+    """
+    img.save(path, quality=quality, optimize=optimize, progressive=optimize)
+
+
+def annotate_file(image_path: str, results_folder: str, quality: int = JPEG_QUALITY,
+                  optimize: bool = False, data: Dict[str, Any] | None = None) -> Tuple[str, int]:
+    """Annotate one image from the labels analyze_drone_image.py saved next to it.
+
+    Uses data (parsed findings already in memory) when given, else
+    <name>_analysis.json if present, else YOLO <name>.txt. Returns the
+    annotated image path and the number of boxes drawn.
+    """
+    if data is not None:
+        items = parse_items_from_json(data)
+    else:
+        stem = os.path.splitext(image_path)[0]
+        try:
+            with open(f"{stem}_analysis.json", "rb") as f:
+                items = parse_items_from_json(json_loads(f.read()))
+        except FileNotFoundError:
+            items = read_yolo_labels(f"{stem}.txt")
+    boxes = BoxSet.from_items(items)
+
+    output_image = os.path.join(results_folder, f"annotated_{os.path.basename(image_path)}")
+    save_annotated(draw_boxes(load_image_from_file(image_path), boxes), output_image, quality, optimize)
+    return output_image, len(boxes)
+
+
+def annotate_files(image_paths: List[str], results_folder: str, max_workers: int | None = None,
+                   quality: int = JPEG_QUALITY, optimize: bool = False) -> int:
+    """Annotate several images in worker processes; returns how many succeeded.
+
+    Decode, drawing and JPEG encode are CPU-bound, so each image gets its own
+    process rather than a thread.
+    """
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(annotate_file, path, results_folder, quality, optimize) for path in image_paths]
+        for path, future in zip(image_paths, futures):
+            try:
+                output_image, count = future.result()
+            except FileNotFoundError:
+                print(f"✗ {path}: no _analysis.json or .txt labels next to it")
                 continue
-            xc, yc, w, h = map(float, yolo_data)
-            x1, y1, x2, y2 = yolo_norm_to_qwen1000(xc, yc, w, h)
-        else:  # qwen format
-            arr = it.get("bbox_2d")
-            if not arr or len(arr) < 4:
+            except Exception as e:
+                print(f"✗ {path}: {e}")
                 continue
-            if len(arr) >= 5:
-                x1, y1, x2, y2 = map(float, arr[1:5])
-            else:
-                x1, y1, x2, y2 = map(float, arr[0:4])
-        
-        lines.append(f"{cls} {x1:.2f} {y1:.2f} {x2:.2f} {y2:.2f}")
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + ("\n" if lines else ""))
+            print(f"✓ {path}: {count} box(es) -> {output_image}")
+            done += 1
+    return done
 
 
 # ---------------- Main ----------------
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Annotate bounding boxes from Qwen-1000, YOLO, or JSON formats")
     
     # Image source
     group = p.add_mutually_exclusive_group()
     group.add_argument("--url", help="Image URL to download")
     group.add_argument("--file", help="Local image file path")
+    group.add_argument("--files-glob",
+                       help="Annotate every matching image from its <name>_analysis.json or <name>.txt labels")
     
     # Label source (mutually exclusive)
     label_group = p.add_mutually_exclusive_group()
@@ -368,49 +581,68 @@ def main():
     p.add_argument("--export-qwen", help="Save Qwen-1000 labels to this file")
     p.add_argument("--out", default="annotated_output.jpg", help="Output annotated image filename")
     p.add_argument("--results-folder", default="results", help="Output folder for all results (default: results)")
-    
-    args = p.parse_args()
-
-    # Load image
-    try:
-        if args.file:
-            if not os.path.exists(args.file):
-                sys.stderr.write(f"File does not exist: {args.file}\n")
-                sys.exit(4)
-            print(f"Loading local file: {args.file}")
-            img = load_image_from_file(args.file)
-        elif args.url:
-            print(f"Downloading image from URL: {args.url}")
-            img = load_image_from_url(args.url)
-        else:
-            print(f"Downloading default image from URL: {DEFAULT_IMAGE_URL}")
-            img = load_image_from_url(DEFAULT_IMAGE_URL)
-    except Exception as e:
-        sys.stderr.write(f"Failed to load image: {e}\n")
-        sys.exit(3)
-
-    # Get items
+    p.add_argument("--no-cache", action="store_true",
+                   help="Always download --url images instead of reusing the local .img_cache copy")
+    p.add_argument("--quality", type=int, default=JPEG_QUALITY,
+                   help=f"JPEG quality of the annotated image (default: {JPEG_QUALITY}; lower encodes faster and smaller)")
+    p.add_argument("--optimize", action="store_true",
+                   help="Write smaller optimized, progressive JPEGs (slower encode; useful before uploading)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Worker processes for --files-glob (default: one per CPU)")
+    return p
+
+
+def run(args: argparse.Namespace, data: Dict[str, Any] | None = None) -> None:
+    """Annotate (and optionally convert) as the command line would, without starting a new interpreter.
+
+    args is a namespace from build_parser(), e.g.
+    run(build_parser().parse_args(["--file", "img.jpg", "--json-file", "img_analysis.json"])).
+    data, when given, is an already parsed findings dict used instead of the
+    label options. Failures exit with the same codes as the CLI (SystemExit).
+    """
+    print(f"Image backend: {pillow_build()}")
+
+    if args.files_glob:
+        # Skip our own outputs so rerunning on a results folder does not annotate them again
+        image_paths = [path for path in sorted(glob.glob(args.files_glob))
+                       if not os.path.basename(path).startswith("annotated_")]
+        if not image_paths:
+            sys.stderr.write(f"No images match: {args.files_glob}\n")
+            sys.exit(4)
+        os.makedirs(args.results_folder, exist_ok=True)
+        print(f"Annotating {len(image_paths)} image(s) from: {args.files_glob}")
+        done = annotate_files(image_paths, args.results_folder, max_workers=args.workers,
+                              quality=args.quality, optimize=args.optimize)
+        print(f"\n📁 Annotated {done}/{len(image_paths)} image(s) into: {args.results_folder}/")
+        return
+
+    # Get items first, so a run without boxes fails before the image is downloaded and decoded
     items: List[Dict[str, Any]] = []
-    if args.labels_qwen:
-        if not os.path.exists(args.labels_qwen):
+    # Missing files are detected by the open itself rather than a separate exists() check
+    if data is not None:
+        items = parse_items_from_json(data)
+    elif args.labels_qwen:
+        print(f"Reading Qwen-1000 labels from: {args.labels_qwen}")
+        try:
+            items = read_qwen_labels(args.labels_qwen)
+        except FileNotFoundError:
             sys.stderr.write(f"Label file does not exist: {args.labels_qwen}\n")
             sys.exit(5)
-        print(f"Reading Qwen-1000 labels from: {args.labels_qwen}")
-        items = read_qwen_labels(args.labels_qwen)
     elif args.labels_yolo:
-        if not os.path.exists(args.labels_yolo):
+        print(f"Reading YOLO labels from: {args.labels_yolo}")
+        try:
+            items = read_yolo_labels(args.labels_yolo)
+        except FileNotFoundError:
             sys.stderr.write(f"Label file does not exist: {args.labels_yolo}\n")
             sys.exit(5)
-        print(f"Reading YOLO labels from: {args.labels_yolo}")
-        items = read_yolo_labels(args.labels_yolo)
     elif args.json_file:
-        if not os.path.exists(args.json_file):
-            sys.stderr.write(f"JSON file does not exist: {args.json_file}\n")
-            sys.exit(5)
         print(f"Reading JSON from file: {args.json_file}")
         try:
-            with open(args.json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(args.json_file, "rb") as f:
+                data = json_loads(f.read())
+        except FileNotFoundError:
+            sys.stderr.write(f"JSON file does not exist: {args.json_file}\n")
+            sys.exit(5)
         except json.JSONDecodeError as e:
             sys.stderr.write(f"Failed to parse JSON file: {e}\n")
             sys.exit(2)
@@ -418,7 +650,7 @@ def main():
     else:
         if args.data:
             try:
-                data = json.loads(args.data)
+                data = json_loads(args.data)
             except json.JSONDecodeError as e:
                 sys.stderr.write(f"Failed to parse --data JSON: {e}\n")
                 sys.exit(2)
@@ -431,6 +663,25 @@ def main():
 
     print(f"Found {len(items)} bounding boxes (format: {items[0].get('format', 'unknown') if items else 'none'})")
 
+    # Load image
+    try:
+        if args.file:
+            print(f"Loading local file: {args.file}")
+            try:
+                img = load_image_from_file(args.file)
+            except FileNotFoundError:
+                sys.stderr.write(f"File does not exist: {args.file}\n")
+                sys.exit(4)
+        elif args.url:
+            print(f"Downloading image from URL: {args.url}")
+            img = load_image_from_url(args.url, use_cache=not args.no_cache)
+        else:
+            print(f"Downloading default image from URL: {DEFAULT_IMAGE_URL}")
+            img = load_image_from_url(DEFAULT_IMAGE_URL, use_cache=not args.no_cache)
+    except Exception as e:
+        sys.stderr.write(f"Failed to load image: {e}\n")
+        sys.exit(3)
+
     # Create results folder
     results_folder = args.results_folder
     os.makedirs(results_folder, exist_ok=True)
@@ -438,15 +689,18 @@ def main():
     # Prepare output paths in results folder
     output_image = os.path.join(results_folder, os.path.basename(args.out))
 
+    # Validate the boxes once for drawing and both exports
+    boxes = BoxSet.from_items(items)
+
     # Draw & save
-    annotated = draw_boxes(img, items)
-    annotated.save(output_image, quality=95)
+    annotated = draw_boxes(img, boxes)
+    save_annotated(annotated, output_image, args.quality, args.optimize)
     print(f"Saved annotated image: {output_image} | size: {annotated.size[0]}x{annotated.size[1]}")
 
     # Export conversions
     if args.export_yolo:
         yolo_path = os.path.join(results_folder, os.path.basename(args.export_yolo))
-        export_yolo(items, yolo_path)
+        export_yolo(boxes, yolo_path)
         print(f"Exported YOLO-normalized labels -> {yolo_path}")
         
         # Also save classes.txt
@@ -456,11 +710,22 @@ def main():
     
     if args.export_qwen:
         qwen_path = os.path.join(results_folder, os.path.basename(args.export_qwen))
-        export_qwen(items, qwen_path)
+        export_qwen(boxes, qwen_path)
         print(f"Exported Qwen-1000 labels -> {qwen_path}")
     
     print(f"\n📁 All files saved to: {results_folder}/")
 
 
+def main(argv: List[str] | None = None) -> None:
+    p = build_parser()
+    args = p.parse_args(argv)
+    if args.files_glob and (args.labels_qwen or args.labels_yolo or args.json_file or args.data
+                            or args.export_yolo or args.export_qwen):
+        p.error("--files-glob reads each image's own labels; it cannot be combined with label or export options")
+    if args.workers is not None and args.workers < 1:
+        p.error("--workers must be at least 1")
+    run(args)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
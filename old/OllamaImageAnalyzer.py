@@ -5,21 +5,197 @@ Analyzes brick wall images for cracks and mortar issues using vision models
 """
 
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import functools
+import io
+import itertools
 import json
-from typing import Dict, Any, Optional
+import mmap
+import os
+import re
+import sys
+import threading
+import warnings
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+# This legacy client lives one level below analyze_drone_image.py and takes the
+# optional pybase64/orjson codecs, image downscaling and streamed-array scanner
+# from it, so both pick the same fallbacks
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+from analyze_drone_image import JsonArrayScanner, base64, json_dumps_bytes, json_loads, shrink_image
+
+# Download chunk size; a multiple of 3 so whole chunks base64-encode without padding
+DOWNLOAD_CHUNK_SIZE = 3 * 64 * 1024
+
+# Read size for streamed chat replies. Ollama sends them chunked, so a read returns
+# as soon as a chunk arrives and a large size only cuts the calls per token
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Longest side sent to the model; larger images are shrunk before encoding.
+# analyze_drone_image.py stops at 672 px because it only runs LLaVA, whose
+# vision tower uses no more. This client takes any vision model, and newer
+# ones use more pixels (llama3.2-vision tiles up to 1120 px, qwen2.5vl works
+# near native resolution), so it keeps more detail and leaves the final
+# resize to the server. Pass max_side=672 when analyzing with LLaVA.
+MAX_IMAGE_SIDE = 1568
+
+# Request bodies are serialized up front (see json_dumps_bytes), so the header is set by hand
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Stands in for each base64 image while a payload is serialized (see _dumps_payload)
+IMAGE_PLACEHOLDER = "\x00image\x00"
+_IMAGE_TOKEN = json_dumps_bytes(IMAGE_PLACEHOLDER)
+
+# Threads fetching and encoding images; also how many images _fetch_many keeps ready ahead
+FETCH_WORKERS = 5
+
+# Shrunk encoded images kept in memory for repeat analyses of the same file or URL;
+# with max_side 0 nothing is kept, as full-size originals can be tens of MB each
+ENCODED_CACHE_SIZE = 32
+
+BRICK_WALL_SYSTEM_PROMPT = (
+    "You are an experienced architect inspecting brick walls for structural issues. "
+    "Analyze images and provide detailed findings about cracks, mortar problems, "
+    "discoloration, and any structural concerns. Be specific about locations and severity."
+)
+
+BRICK_WALL_PROMPT = (
+    "Inspect this brick wall image for:\n"
+    "1. Cracks (location, size, direction)\n"
+    "2. Mortar issues (missing, deteriorated, gaps)\n"
+    "3. Discoloration or water damage\n"
+    "4. Structural concerns\n\n"
+    "Provide your findings in JSON format with these fields:\n"
+    "- location: where the issue is found\n"
+    "- severity: low, medium, high, critical\n"
+    "- type: crack, mortar_deterioration, water_damage, etc.\n"
+    "- description: detailed description of the issue\n"
+    "- recommendations: suggested actions"
+)
+
+# Start of the first array of objects in a reply: the list of findings
+FINDINGS_ARRAY_RE = re.compile(r'\[\s*(?=\{)')
+
+# Appended to BRICK_WALL_PROMPT when several images share one request
+BATCH_PROMPT_SUFFIX = (
+    "\n\nYou are given {count} images, numbered 1 to {count} in the order attached. "
+    "Inspect each one separately and return a single JSON object of the form "
+    '{{"images": [{{"image": <number>, "findings": [...]}}]}} with one entry per image.'
+)
+
+
+def _dumps_payload(payload: Dict[str, Any]) -> bytes:
+    """
+    Serialize a chat payload whose messages carry their base64 images as bytes
+    
+    The images are swapped for a placeholder, the small envelope is serialized,
+    and the base64 bytes are spliced in where the placeholders landed, so the
+    multi-MB blobs are never decoded to str or scanned by the JSON encoder.
+    """
+    images: List[bytes] = []
+    messages = []
+    for message in payload["messages"]:
+        if message.get("images"):
+            images.extend(message["images"])
+            message = dict(message, images=[IMAGE_PLACEHOLDER] * len(message["images"]))
+        messages.append(message)
+    pieces = json_dumps_bytes(dict(payload, messages=messages)).split(_IMAGE_TOKEN)
+    body = [pieces[0]]
+    for image, piece in zip(images, pieces[1:]):
+        body += (b'"', image, b'"', piece)
+    return b"".join(body)
+
+
+def _read_image_body(response) -> io.BytesIO:
+    """
+    Read a downloaded image into a BytesIO for Pillow to open and base64 to encode in place
+    
+    When the server announces the size, the buffer is grown to it once and the
+    chunks are written straight in, instead of being collected and joined
+    afterwards as response.content does.
+    """
+    length = int(response.headers.get("Content-Length") or 0)
+    if not length or response.headers.get("Content-Encoding", "identity") != "identity":
+        # Size not known up front (or compressed on the wire): take it in one piece
+        return io.BytesIO(response.content)
+    body = io.BytesIO()
+    body.seek(length - 1)
+    body.write(b"\0")  # grow the buffer to the full size in one step
+    body.seek(0)
+    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+
+def _encode_file(file_path: str, max_side: int) -> bytes:
+    """Base64-encode a local image, shrunk to max_side if larger"""
+    if max_side:
+        small = shrink_image(file_path, max_side)
+        if small is not None:
+            return base64.b64encode(small)
+    with open(file_path, 'rb') as image_file:
+        if os.fstat(image_file.fileno()).st_size == 0:
+            return b""  # an empty file cannot be mapped
+        # Encode straight from the page cache instead of reading a bytes copy first
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return base64.b64encode(mapped)
+
+
+@functools.lru_cache(maxsize=ENCODED_CACHE_SIZE)
+def _encode_shrunk_file(file_path: str, mtime_ns: int, size: int, max_side: int) -> bytes:
+    """
+    _encode_file for a non-zero max_side, cached per (path, mtime_ns, size, max_side)
+    
+    Analyzing the same file again with another prompt or model skips the read
+    and encode; the entries are at most max_side pixels a side, so stay small.
+    """
+    return _encode_file(file_path, max_side)
+
 
 class OllamaImageAnalyzer:
     """Client for analyzing images using Ollama vision models"""
     
-    def __init__(self, base_url: str = "http://192.168.87.207:11434"):
+    def __init__(self, base_url: str = "http://192.168.87.207:11434", max_side: int = MAX_IMAGE_SIDE):
         self.base_url = base_url
         self.chat_endpoint = f"{base_url}/api/chat"
         self.generate_endpoint = f"{base_url}/api/generate"
+        # Images are downscaled to this longest side before upload; 0 sends them unchanged
+        self.max_side = max_side
+        # One pooled keep-alive session for image downloads and Ollama calls;
+        # POSTs are only retried when the connection could not be made
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=16, max_retries=Retry(
+            total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504)))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # Bounded pool for fetching and encoding several images at once
+        self._pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+        # (URL, max_side) -> (ETag, base64) of recent shrunk downloads, revalidated with If-None-Match
+        self._url_cache: "OrderedDict[Tuple[str, int], Tuple[str, bytes]]" = OrderedDict()
+        self._url_cache_lock = threading.Lock()
+        # (model, stream) -> serialized single-image brick wall request, split where the image goes
+        self._brick_templates: Dict[Tuple[str, bool], Tuple[bytes, bytes]] = {}
+    
+    def close(self) -> None:
+        """Stop the fetch threads and close the pooled HTTP connections"""
+        self._pool.shutdown()
+        self._session.close()
+    
+    def __enter__(self) -> "OllamaImageAnalyzer":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
-    def image_url_to_base64(self, image_url: str) -> str:
+    def image_url_to_base64(self, image_url: str) -> bytes:
         """
         Download image from URL and convert to base64
         
@@ -27,16 +203,54 @@ class OllamaImageAnalyzer:
             image_url: URL of the image to download
             
         Returns:
-            Base64 encoded string of the image
+            Base64 encoded bytes of the image, shrunk to max_side if larger
         """
+        with self._url_cache_lock:
+            cached = self._url_cache.get((image_url, self.max_side))
+        headers = {"If-None-Match": cached[0]} if cached else None
         try:
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            return base64.b64encode(response.content).decode('utf-8')
+            with self._session.get(image_url, headers=headers, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                if cached and response.status_code == 304:
+                    return cached[1]  # unchanged since the last download
+                if self.max_side:
+                    # The image has to be decoded to be shrunk, so take it in one piece
+                    with _read_image_body(response) as data:
+                        small = shrink_image(data, self.max_side)
+                        if small is None:
+                            with data.getbuffer() as view:
+                                image_base64 = base64.b64encode(view)
+                        else:
+                            image_base64 = base64.b64encode(small)
+                    return self._remember_url(image_url, response, image_base64)
+                # Encode chunk by chunk; a chunk's last len % 3 bytes are carried
+                # over so no padding lands in the middle of the output
+                encoded = bytearray()
+                pending = b""
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if pending:
+                        chunk = pending + chunk
+                    cut = len(chunk) - len(chunk) % 3
+                    encoded += base64.b64encode(memoryview(chunk)[:cut])
+                    pending = chunk[cut:]
+                encoded += base64.b64encode(pending)
+                return bytes(encoded)  # full size, too big to keep
         except requests.RequestException as e:
             raise Exception(f"Failed to download image: {e}")
     
-    def image_file_to_base64(self, file_path: str) -> str:
+    def _remember_url(self, image_url: str, response, image_base64: bytes) -> bytes:
+        """Cache the shrunk image_base64 under the response's ETag (if it has one) and return it"""
+        etag = response.headers.get("ETag")
+        if etag:
+            key = (image_url, self.max_side)
+            with self._url_cache_lock:
+                self._url_cache[key] = (etag, image_base64)
+                self._url_cache.move_to_end(key)
+                if len(self._url_cache) > ENCODED_CACHE_SIZE:
+                    self._url_cache.popitem(last=False)
+        return image_base64
+    
+    def image_file_to_base64(self, file_path: str) -> bytes:
         """
         Read local image file and convert to base64
         
@@ -44,19 +258,44 @@ class OllamaImageAnalyzer:
             file_path: Path to the image file
             
         Returns:
-            Base64 encoded string of the image
+            Base64 encoded bytes of the image, shrunk to max_side if larger
         """
         try:
-            with open(file_path, 'rb') as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            if not self.max_side:
+                return _encode_file(file_path, 0)
+            # Keyed on the file's version, so an edited file is encoded again
+            stat = os.stat(file_path)
+            return _encode_shrunk_file(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, self.max_side)
         except IOError as e:
             raise Exception(f"Failed to read image file: {e}")
     
+    def image_to_base64(self, image_source: str) -> bytes:
+        """
+        Base64-encode an image from a URL or a local file
+        
+        Args:
+            image_source: http:// or https:// URL, or path to the image file
+            
+        Returns:
+            Base64 encoded bytes of the image, shrunk to max_side if larger
+        """
+        if image_source.startswith(("http://", "https://")):
+            return self.image_url_to_base64(image_source)
+        return self.image_file_to_base64(image_source)
+    
+    def _image_reader(self, is_url: Optional[bool]) -> Callable[[str], bytes]:
+        """Pick the encoder for the deprecated is_url flag; None detects the source by its scheme"""
+        if is_url is None:
+            return self.image_to_base64
+        warnings.warn("is_url is deprecated; URLs are recognized by their http:// or https:// scheme",
+                      DeprecationWarning, stacklevel=3)
+        return self.image_url_to_base64 if is_url else self.image_file_to_base64
+    
     def analyze_brick_wall(
         self,
         image_source: str,
         model: str = "llava",
-        is_url: bool = True,
+        is_url: Optional[bool] = None,
         stream: bool = False
     ) -> Dict[str, Any]:
         """
@@ -65,47 +304,147 @@ class OllamaImageAnalyzer:
         Args:
             image_source: URL or file path to the image
             model: Ollama model to use (default: llava)
-            is_url: True if image_source is URL, False if file path
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
             stream: Whether to stream the response
             
         Returns:
             Dictionary containing the analysis results
         """
-        # Convert image to base64
-        if is_url:
-            image_base64 = self.image_url_to_base64(image_source)
-        else:
-            image_base64 = self.image_file_to_base64(image_source)
+        image_base64 = self._image_reader(is_url)(image_source)
+        body = self._brick_wall_body(model, image_base64, stream)
+        return self._post_chat(body, stream)
+    
+    def analyze_brick_walls(
+        self,
+        image_sources: List[str],
+        model: str = "llava",
+        is_url: Optional[bool] = None,
+        batch_size: int = 4
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze several brick wall images, sending up to batch_size images per request
         
-        # Prepare the request payload
-        payload = {
+        Args:
+            image_sources: URLs or file paths of the images
+            model: Ollama model to use (default: llava)
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
+            batch_size: Number of images attached to one chat request
+            
+        Returns:
+            One response dictionary per request, in order. Its JSON content has an
+            "images" list with the findings for each image, numbered from 1 within the request
+        """
+        encoded = self._fetch_many(image_sources, self._image_reader(is_url))
+        results = []
+        for start in range(0, len(image_sources), batch_size):
+            images = [next(encoded) for _ in image_sources[start:start + batch_size]]
+            prompt = BRICK_WALL_PROMPT + BATCH_PROMPT_SUFFIX.format(count=len(images))
+            payload = self._brick_wall_payload(model, images, prompt, stream=False)
+            results.append(self._post_chat(_dumps_payload(payload), stream=False))
+        return results
+    
+    def analyze_many(
+        self,
+        image_sources: List[str],
+        model: str = "llava",
+        is_url: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze several brick wall images with one request each
+        
+        The images are fetched and encoded on the thread pool, so the next ones
+        are ready by the time the model has answered the current one.
+        
+        Args:
+            image_sources: URLs or file paths of the images
+            model: Ollama model to use (default: llava)
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
+            
+        Returns:
+            One response dictionary per image, in input order
+        """
+        return [
+            self._post_chat(self._brick_wall_body(model, image_base64, stream=False), stream=False)
+            for image_base64 in self._fetch_many(image_sources, self._image_reader(is_url))
+        ]
+    
+    async def analyze_brick_wall_async(
+        self,
+        image_source: str,
+        model: str = "llava",
+        is_url: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """
+        Awaitable analyze_brick_wall; the request runs on a worker thread
+        
+        Args:
+            image_source: URL or file path to the image
+            model: Ollama model to use (default: llava)
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
+            
+        Returns:
+            Dictionary containing the analysis results
+        """
+        return await asyncio.to_thread(self.analyze_brick_wall, image_source, model, is_url)
+    
+    async def analyze_many_async(
+        self,
+        image_sources: List[str],
+        model: str = "llava",
+        is_url: Optional[bool] = None,
+        concurrency: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze several brick wall images with up to concurrency requests in flight
+        
+        Ollama queues the requests it cannot run in parallel, so uploads and
+        downloads of the next images overlap with the model working on earlier ones.
+        
+        Args:
+            image_sources: URLs or file paths of the images
+            model: Ollama model to use (default: llava)
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
+            concurrency: Maximum number of requests sent at once
+            
+        Returns:
+            One response dictionary per image, in input order
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def analyze(image_source: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.analyze_brick_wall_async(image_source, model, is_url)
+        
+        return await asyncio.gather(*(analyze(source) for source in image_sources))
+    
+    def _fetch_many(self, image_sources: List[str], to_base64: Callable[[str], bytes]) -> Iterator[bytes]:
+        """
+        Fetch and base64-encode images on the thread pool, yielding them in input order
+        
+        Up to FETCH_WORKERS images are fetched ahead of the one being yielded, so
+        the next ones download while the caller waits on the model, without
+        holding every encoded image of a long list in memory at once.
+        """
+        sources = iter(image_sources)
+        pending = deque(self._pool.submit(to_base64, source)
+                        for source in itertools.islice(sources, FETCH_WORKERS))
+        try:
+            while pending:
+                image_base64 = pending.popleft().result()
+                for source in itertools.islice(sources, 1):
+                    pending.append(self._pool.submit(to_base64, source))
+                yield image_base64
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _brick_wall_payload(self, model: str, images: List[bytes], prompt: str, stream: bool) -> Dict[str, Any]:
+        """Build the brick wall inspection chat payload for one or more base64 images"""
+        return {
             "model": model,
             "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an experienced architect inspecting brick walls for structural issues. "
-                        "Analyze images and provide detailed findings about cracks, mortar problems, "
-                        "discoloration, and any structural concerns. Be specific about locations and severity."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        "Inspect this brick wall image for:\n"
-                        "1. Cracks (location, size, direction)\n"
-                        "2. Mortar issues (missing, deteriorated, gaps)\n"
-                        "3. Discoloration or water damage\n"
-                        "4. Structural concerns\n\n"
-                        "Provide your findings in JSON format with these fields:\n"
-                        "- location: where the issue is found\n"
-                        "- severity: low, medium, high, critical\n"
-                        "- type: crack, mortar_deterioration, water_damage, etc.\n"
-                        "- description: detailed description of the issue\n"
-                        "- recommendations: suggested actions"
-                    ),
-                    "images": [image_base64]
-                }
+                {"role": "system", "content": BRICK_WALL_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt, "images": images}
             ],
             "format": "json",
             "stream": stream,
@@ -114,12 +453,35 @@ class OllamaImageAnalyzer:
                 "top_p": 0.9
             }
         }
+    
+    def _brick_wall_body(self, model: str, image_base64: bytes, stream: bool) -> bytes:
+        """
+        Serialized single-image brick wall request
         
-        # Make the request
+        Everything but the image is fixed per (model, stream), so that part is
+        serialized once and each call only joins the image between the two halves.
+        The image is encoded before the request starts, so a failed download or
+        decode never leaves a half-sent request at the server.
+        """
+        prefix, suffix = self._brick_template(model, stream)
+        return b"".join((prefix, b'"', image_base64, b'"', suffix))
+    
+    def _brick_template(self, model: str, stream: bool) -> Tuple[bytes, bytes]:
+        """Serialized single-image brick wall request, split where the image goes"""
+        template = self._brick_templates.get((model, stream))
+        if template is None:
+            payload = self._brick_wall_payload(model, [IMAGE_PLACEHOLDER], BRICK_WALL_PROMPT, stream)
+            prefix, suffix = json_dumps_bytes(payload).split(_IMAGE_TOKEN)
+            template = self._brick_templates[(model, stream)] = (prefix, suffix)
+        return template
+    
+    def _post_chat(self, body: bytes, stream: bool) -> Dict[str, Any]:
+        """Send a serialized chat request and return the response, printing it as it arrives when streaming"""
         try:
-            response = requests.post(
+            response = self._session.post(
                 self.chat_endpoint,
-                json=payload,
+                data=body,
+                headers=JSON_HEADERS,
                 timeout=120,
                 stream=stream
             )
@@ -128,41 +490,82 @@ class OllamaImageAnalyzer:
             if stream:
                 return self._handle_stream_response(response)
             else:
-                return response.json()
+                return json_loads(response.content)
                 
         except requests.RequestException as e:
             raise Exception(f"API request failed: {e}")
     
     def _handle_stream_response(self, response) -> Dict[str, Any]:
         """Handle streaming response from Ollama"""
-        full_content = ""
+        parts: List[str] = []
         
-        for line in response.iter_lines():
+        for content in self._iter_stream_tokens(response):
+            parts.append(content)
+            print(content, end="", flush=True)
+        print()  # New line after streaming
+        
+        # One join at the end instead of re-copying the reply on every token
+        return {"message": {"content": "".join(parts)}, "done": True}
+    
+    def _iter_stream_tokens(self, response) -> Iterator[str]:
+        """Yield the message content pieces of a streamed Ollama chat response as they arrive"""
+        # Lines stay bytes; only the content field comes out as str
+        for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE, decode_unicode=False):
             if line:
                 try:
-                    chunk = json.loads(line)
-                    if "message" in chunk and "content" in chunk["message"]:
-                        content = chunk["message"]["content"]
-                        full_content += content
-                        print(content, end="", flush=True)
-                    
-                    if chunk.get("done", False):
-                        print()  # New line after streaming
-                        return {
-                            "message": {"content": full_content},
-                            "done": True
-                        }
-                except json.JSONDecodeError:
+                    chunk = json_loads(line)
+                except ValueError:  # json.JSONDecodeError and orjson.JSONDecodeError
                     continue
+                if "message" in chunk and "content" in chunk["message"]:
+                    yield chunk["message"]["content"]
+                if chunk.get("done", False):
+                    return
+    
+    def iter_findings(
+        self,
+        image_source: str,
+        model: str = "llava",
+        is_url: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a brick wall analysis and yield each finding as soon as it is complete
         
-        return {"message": {"content": full_content}, "done": True}
+        Each object of the first JSON array of objects in the reply (the findings
+        list) is decoded the moment its closing brace arrives, so callers can act
+        on early findings while the model is still writing the rest.
+        
+        Args:
+            image_source: URL or file path to the image
+            model: Ollama model to use (default: llava)
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
+            
+        Yields:
+            Finding dictionaries in the order the model writes them
+        """
+        image_base64 = self._image_reader(is_url)(image_source)
+        body = self._brick_wall_body(model, image_base64, stream=True)
+        
+        try:
+            with self._session.post(
+                self.chat_endpoint,
+                data=body,
+                headers=JSON_HEADERS,
+                timeout=120,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                scanner = JsonArrayScanner(FINDINGS_ARRAY_RE)
+                for token in self._iter_stream_tokens(response):
+                    yield from scanner.feed(token)
+        except requests.RequestException as e:
+            raise Exception(f"API request failed: {e}")
     
     def simple_analyze(
         self,
         image_source: str,
         prompt: str,
         model: str = "llava",
-        is_url: bool = True
+        is_url: Optional[bool] = None
     ) -> str:
         """
         Simple image analysis with custom prompt
@@ -171,15 +574,12 @@ class OllamaImageAnalyzer:
             image_source: URL or file path to the image
             prompt: Custom prompt for analysis
             model: Ollama model to use
-            is_url: True if image_source is URL, False if file path
+            is_url: Deprecated; http:// and https:// sources are downloaded, others read as files
             
         Returns:
             Analysis result as string
         """
-        if is_url:
-            image_base64 = self.image_url_to_base64(image_source)
-        else:
-            image_base64 = self.image_file_to_base64(image_source)
+        image_base64 = self._image_reader(is_url)(image_source)
         
         payload = {
             "model": model,
@@ -194,9 +594,14 @@ class OllamaImageAnalyzer:
         }
         
         try:
-            response = requests.post(self.chat_endpoint, json=payload, timeout=120)
+            response = self._session.post(
+                self.chat_endpoint,
+                data=_dumps_payload(payload),
+                headers=JSON_HEADERS,
+                timeout=120
+            )
             response.raise_for_status()
-            result = response.json()
+            result = json_loads(response.content)
             return result.get("message", {}).get("content", "")
         except requests.RequestException as e:
             raise Exception(f"API request failed: {e}")
@@ -212,32 +617,34 @@ def main():
     print("Ollama Image Analyzer - Brick Wall Inspection")
     print("=" * 70)
     
-    # Example 1: Analyze from URL
-    print("\n[Example 1] Analyzing brick wall from URL...")
+    # Example 1: Analyze from URLs
+    print("\n[Example 1] Analyzing brick walls from URLs...")
     print("-" * 70)
     
     try:
-        image_url = "https://obj3423.public-dk6.clu4.obj.storagefactory.io/dev-poc-drone-images/Chat/Testpulje/uploaded/DJI_0942.JPG"
+        # Add more URLs here; the next image downloads while the model answers the current one
+        image_urls = [
+            "https://obj3423.public-dk6.clu4.obj.storagefactory.io/dev-poc-drone-images/Chat/Testpulje/uploaded/DJI_0942.JPG",
+        ]
         
-        result = analyzer.analyze_brick_wall(
-            image_source=image_url,
-            model="llava",
-            is_url=True,
-            stream=False
+        results = analyzer.analyze_many(
+            image_sources=image_urls,
+            model="llava"
         )
         
-        # Extract and parse the response
-        content = result.get("message", {}).get("content", "")
-        print("\nAnalysis Result:")
-        print(content)
-        
-        # Try to parse as JSON if formatted correctly
-        try:
-            findings = json.loads(content)
-            print("\n\nParsed Findings:")
-            print(json.dumps(findings, indent=2))
-        except json.JSONDecodeError:
-            print("\n(Response was not in JSON format)")
+        for image_url, result in zip(image_urls, results):
+            # Extract and parse the response
+            content = result.get("message", {}).get("content", "")
+            print(f"\nAnalysis Result for {image_url}:")
+            print(content)
+            
+            # Try to parse as JSON if formatted correctly
+            try:
+                findings = json.loads(content)
+                print("\n\nParsed Findings:")
+                print(json.dumps(findings, indent=2))
+            except json.JSONDecodeError:
+                print("\n(Response was not in JSON format)")
             
     except Exception as e:
         print(f"Error: {e}")
@@ -253,7 +660,6 @@ def main():
         result = analyzer.analyze_brick_wall(
             image_source=local_image,
             model="llava",
-            is_url=False,
             stream=False
         )
         
@@ -270,14 +676,12 @@ def main():
     print("-" * 70)
     
     try:
-        analyzer_stream = OllamaImageAnalyzer()
-        
-        result = analyzer_stream.simple_analyze(
-            image_source="https://example.com/wall.jpg",  # Replace with your URL
-            prompt="Describe this image in detail. What materials and conditions do you see?",
-            model="llava",
-            is_url=True
-        )
+        with OllamaImageAnalyzer() as analyzer_stream:
+            result = analyzer_stream.simple_analyze(
+                image_source="https://example.com/wall.jpg",  # Replace with your URL
+                prompt="Describe this image in detail. What materials and conditions do you see?",
+                model="llava"
+            )
         
         print("\nSimple Analysis:")
         print(result)
@@ -285,6 +689,8 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
     
+    analyzer.close()
+    
     print("\n" + "=" * 70)
     print("Analysis Complete")
     print("=" * 70)
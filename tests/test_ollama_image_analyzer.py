@@ -0,0 +1,73 @@
+"""Downloads in old/OllamaImageAnalyzer.py, served from a local HTTP server."""
+
+import base64
+import io
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image, UnidentifiedImageError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "old"))
+from OllamaImageAnalyzer import OllamaImageAnalyzer  # noqa: E402
+
+
+def _jpeg(size) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (120, 60, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+BODIES = {
+    "/not-an-image.jpg": b"<html>not found</html>",
+    "/small.jpg": _jpeg((64, 48)),
+    "/large.jpg": _jpeg((2000, 1000)),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = BODIES[self.path]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageUrlToBase64Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.analyzer = OllamaImageAnalyzer(max_side=1568)
+        self.addCleanup(self.analyzer.close)
+
+    def test_non_image_body_raises_unidentified_image_error(self):
+        with self.assertRaises(UnidentifiedImageError):
+            self.analyzer.image_url_to_base64(f"{self.base_url}/not-an-image.jpg")
+
+    def test_image_within_max_side_is_sent_unchanged(self):
+        encoded = self.analyzer.image_url_to_base64(f"{self.base_url}/small.jpg")
+        self.assertEqual(encoded, base64.b64encode(BODIES["/small.jpg"]))
+
+    def test_large_image_is_shrunk_to_max_side(self):
+        encoded = self.analyzer.image_url_to_base64(f"{self.base_url}/large.jpg")
+        with Image.open(io.BytesIO(base64.b64decode(encoded))) as img:
+            self.assertEqual(img.size, (1568, 784))
+
+
+if __name__ == "__main__":
+    unittest.main()